@@ -5,6 +5,7 @@ DS18B20 溫度感測器讀取程式
 主要功能包括：
 - 初始化溫度感測器
 - 讀取溫度值
+- 在背景預先觸發溫度轉換，讓下一次讀取不必等待轉換完成
 - 錯誤處理和重試機制
 - 溫度值的格式化顯示
 - 日誌記錄
@@ -15,16 +16,18 @@ DS18B20 溫度感測器讀取程式
 3. 按 Ctrl+C 可停止程式
 
 依賴套件：
-- w1thermsensor: 用於與 DS18B20 感測器通訊
+- w1thermsensor: 用於尋找 DS18B20 感測器（溫度值直接從 w1_slave 檔案讀取）
 - logging: 用於記錄程式執行狀態
-- datetime: 用於記錄溫度讀取時間
 """
 
 from w1thermsensor import W1ThermSensor
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
 import time
 from typing import Optional, Tuple
 import logging
-from datetime import datetime
 
 # 設定日誌格式和等級
 # 日誌格式包含時間戳記、日誌等級和訊息內容
@@ -34,6 +37,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 1-Wire 裝置目錄，每個感測器的 w1_slave 檔案位於 <目錄>/<感測器 ID>/w1_slave
+W1_DEVICES_DIR = '/sys/bus/w1/devices'
+# w1_slave 內容約 75 位元組，128 位元組的緩衝區足以一次讀完
+W1_SLAVE_BUFFER_SIZE = 128
+# w1_slave 第二行的溫度值，單位為千分之一攝氏度，例如 t=25062
+_TEMPERATURE_PATTERN = re.compile(rb't=(-?\d+)')
+# 匯流排異常或感測器斷線時讀到全為 0 的暫存器，CRC 同樣為 0 而會顯示 YES
+_EMPTY_SCRATCHPAD = b'00 00 00 00 00 00 00 00 00'
+# 上電重置值 85°C（千分之一攝氏度），表示感測器尚未完成任何一次轉換
+RESET_VALUE = 85000
+# 批次轉換進行中時 w1_slave 讀到空內容，以此間隔（秒）輪詢，超過逾時時間（秒）視為失敗
+CONVERSION_POLL_INTERVAL = 0.05
+CONVERSION_TIMEOUT = 1.0
+
 class TemperatureSensor:
     """
     溫度感測器類別
@@ -43,10 +60,16 @@ class TemperatureSensor:
     
     屬性：
         sensor: W1ThermSensor 實例
+        device_path: 感測器 w1_slave 檔案路徑
+        bulk_read_path: 感測器所在 1-Wire 匯流排的 therm_bulk_read 檔案路徑
         retry_interval: 重試間隔時間（秒）
         max_retries: 最大重試次數
         gpio_pin: 使用的 GPIO 引腳編號
     """
+    # 固定屬性，不為每個實例建立 __dict__，多個感測器實例時可節省記憶體
+    __slots__ = ('sensor', 'device_path', 'bulk_read_path', 'retry_interval', 'max_retries',
+                 'gpio_pin', '_fd', '_bulk_read_fd', '_buffer', '_read_buffers')
+
     def __init__(self, gpio_pin: int = 4, retry_interval: int = 1, max_retries: int = 3):
         """
         初始化溫度感測器
@@ -57,56 +80,169 @@ class TemperatureSensor:
             max_retries (int): 最大重試次數，預設為 3 次
         """
         self.sensor = None
+        self.device_path = None
+        self.bulk_read_path = None
         self.retry_interval = retry_interval
         self.max_retries = max_retries
         self.gpio_pin = gpio_pin
+        # w1_slave 檔案描述子與讀取緩衝區，在初始化時建立並於每次讀取時重複使用
+        self._fd = None
+        self._bulk_read_fd = None
+        self._buffer = bytearray(W1_SLAVE_BUFFER_SIZE)
+        # os.preadv 使用的緩衝區串列，預先建立以免每次讀取都建立新串列
+        self._read_buffers = [self._buffer]
         self.initialize_sensor()
 
     def initialize_sensor(self) -> bool:
         """
         初始化感測器
         
-        嘗試建立與 DS18B20 感測器的連接。
+        嘗試建立與 DS18B20 感測器的連接，並開啟感測器的 w1_slave 檔案。
+        檔案只在初始化時開啟一次，之後的讀取都重複使用同一個檔案描述子。
         如果初始化失敗，會記錄錯誤並返回 False。
         
         Returns:
             bool: 初始化是否成功
         """
+        self.close()
         try:
             self.sensor = W1ThermSensor(W1ThermSensor.THERM_SENSOR_DS18B20, self.gpio_pin)
+            self.device_path = os.path.join(W1_DEVICES_DIR, self.sensor.id, 'w1_slave')
+            self._fd = os.open(self.device_path, os.O_RDONLY)
+            # 感測器目錄是指向 /sys/devices/w1_bus_masterN/<感測器 ID> 的連結
+            bus_master_dir = os.path.dirname(os.path.realpath(os.path.join(W1_DEVICES_DIR, self.sensor.id)))
+            self.bulk_read_path = os.path.join(bus_master_dir, 'therm_bulk_read')
             logger.info(f"溫度感測器初始化成功 (GPIO{self.gpio_pin})")
             return True
         except Exception as e:
             logger.error(f"初始化感測器時發生錯誤 (GPIO{self.gpio_pin}): {e}")
-            self.sensor = None
+            self.close()
             return False
 
-    def read_temperature(self) -> Optional[Tuple[float, datetime]]:
+    def close(self) -> None:
+        """
+        關閉感測器
+        
+        關閉 w1_slave 與 therm_bulk_read 檔案描述子並清除感測器實例。
+        """
+        for fd in (self._fd, self._bulk_read_fd):
+            if fd is None:
+                continue
+            try:
+                os.close(fd)
+            except OSError as e:
+                logger.error(f"關閉感測器檔案時發生錯誤: {e}")
+        self._fd = None
+        self._bulk_read_fd = None
+        self.sensor = None
+        self.device_path = None
+        self.bulk_read_path = None
+
+    def trigger_conversion(self) -> bool:
+        """
+        觸發溫度轉換
+        
+        寫入 therm_bulk_read 讓匯流排上所有感測器同時開始溫度轉換（約 750 毫秒），
+        之後讀取 w1_slave 時核心驅動會直接回傳轉換結果，不再重新轉換。
+        依驅動與供電方式，寫入可能阻塞到轉換完成為止，
+        因此需要不阻塞時應在背景執行緒中呼叫（main() 即如此），
+        讓轉換在等待下一次取樣的期間完成。
+        需要 Linux 5.10 以上的 w1_therm 驅動，不支援時讀取仍會照常進行轉換。
+        
+        Returns:
+            bool: 是否成功觸發轉換
+        """
+        if self.bulk_read_path is None:
+            return False
+        if self._bulk_read_fd is None:
+            try:
+                self._bulk_read_fd = os.open(self.bulk_read_path, os.O_WRONLY)
+            except OSError as e:
+                # 驅動不支援批次轉換，之後不再嘗試，讀取時照常轉換
+                logger.warning(f"無法開啟 {self.bulk_read_path}，停用預先觸發溫度轉換: {e}")
+                self.bulk_read_path = None
+                return False
+        try:
+            os.pwrite(self._bulk_read_fd, b'trigger\n', 0)
+            return True
+        except OSError as e:
+            logger.warning(f"觸發溫度轉換失敗: {e}")
+            return False
+
+    def _read_device_file(self) -> float:
+        """
+        直接讀取並解析 w1_slave 檔案
+        
+        從檔案開頭讀入預先配置的緩衝區。若已呼叫 trigger_conversion()，
+        核心驅動會回傳該次轉換的結果；否則每次讀取都會重新進行一次溫度轉換。
+        批次轉換尚未完成時會讀到空內容，此時每隔 CONVERSION_POLL_INTERVAL 秒重新讀取，
+        直到取得資料或超過 CONVERSION_TIMEOUT 秒。
+        w1_slave 的內容格式如下，第一行結尾為 CRC 校驗結果，第二行為溫度值：
+            72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+            72 01 4b 46 7f ff 0e 10 57 t=23125
+        全為 0 的暫存器與上電重置值 85°C 不是有效的測量結果，
+        與 w1thermsensor 相同視為讀取失敗，交由 read_temperature_with_retry() 重試。
+        
+        Returns:
+            float: 溫度值（攝氏度）
+            
+        Raises:
+            RuntimeError: 溫度轉換逾時、CRC 校驗失敗、暫存器全為 0、
+                讀到上電重置值或找不到溫度值時
+        """
+        length = os.preadv(self._fd, self._read_buffers, 0)
+        if length == 0:
+            deadline = time.monotonic() + CONVERSION_TIMEOUT
+            while length == 0:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError("溫度轉換逾時")
+                time.sleep(CONVERSION_POLL_INTERVAL)
+                length = os.preadv(self._fd, self._read_buffers, 0)
+        if self._buffer.find(b'YES', 0, length) < 0:
+            raise RuntimeError("感測器資料 CRC 校驗失敗")
+        if self._buffer.startswith(_EMPTY_SCRATCHPAD):
+            raise RuntimeError("感測器暫存器全為 0，請檢查感測器連接")
+        match = _TEMPERATURE_PATTERN.search(self._buffer, 0, length)
+        if match is None:
+            raise RuntimeError("感測器資料中找不到溫度值")
+        raw_temperature = int(match.group(1))
+        if raw_temperature == RESET_VALUE:
+            raise RuntimeError("感測器回傳上電重置值 85°C，溫度尚未轉換")
+        return raw_temperature / 1000.0
+
+    def read_temperature(self) -> Optional[Tuple[float, int]]:
         """
         讀取溫度
         
-        從感測器讀取當前溫度值，並記錄讀取時間。
+        從感測器讀取當前溫度值，並以 time.time_ns() 記錄讀取時間。
+        時間戳記保持為整數，需要顯示時再轉換為 datetime。
         如果感測器未初始化，會嘗試重新初始化。
         如果讀取失敗，會記錄錯誤並返回 None。
+        讀取檔案發生 OSError 時（例如匯流排重新列舉後檔案描述子失效），
+        會關閉感測器，讓下一次讀取重新開啟檔案。
         
         Returns:
-            Optional[Tuple[float, datetime]]: 
-                - 成功時返回 (溫度值, 讀取時間)
+            Optional[Tuple[float, int]]: 
+                - 成功時返回 (溫度值, 讀取時間的 Unix 時間戳記（奈秒）)
                 - 失敗時返回 None
         """
-        if self.sensor is None:
+        if self._fd is None:
             logger.warning("嘗試重新初始化感測器...")
             if not self.initialize_sensor():
                 return None
 
         try:
-            temperature_c = self.sensor.get_temperature()
-            return temperature_c, datetime.now()
+            temperature_c = self._read_device_file()
+            return temperature_c, time.time_ns()
+        except OSError as e:
+            logger.error(f"讀取感測器檔案時發生錯誤: {e}")
+            self.close()
+            return None
         except Exception as e:
             logger.error(f"讀取溫度時發生錯誤: {e}")
             return None
 
-    def read_temperature_with_retry(self) -> Optional[Tuple[float, datetime]]:
+    def read_temperature_with_retry(self) -> Optional[Tuple[float, int]]:
         """
         重試讀取溫度
         
@@ -114,8 +250,8 @@ class TemperatureSensor:
         每次重試之間會等待指定的間隔時間。
         
         Returns:
-            Optional[Tuple[float, datetime]]: 
-                - 成功時返回 (溫度值, 讀取時間)
+            Optional[Tuple[float, int]]: 
+                - 成功時返回 (溫度值, 讀取時間的 Unix 時間戳記（奈秒）)
                 - 所有重試都失敗時返回 None
         """
         for attempt in range(self.max_retries):
@@ -127,6 +263,21 @@ class TemperatureSensor:
                 time.sleep(self.retry_interval)
         return None
 
+    async def sample(self) -> Optional[Tuple[float, int]]:
+        """
+        非同步讀取溫度
+        
+        在執行緒池中執行 read_temperature_with_retry()，
+        讓等待 1-Wire 讀取的期間可以同時處理其他感測器。
+        
+        Returns:
+            Optional[Tuple[float, int]]: 
+                - 成功時返回 (溫度值, 讀取時間的 Unix 時間戳記（奈秒）)
+                - 所有重試都失敗時返回 None
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.read_temperature_with_retry)
+
 def format_temperature(temperature: float) -> str:
     """
     格式化溫度顯示
@@ -141,29 +292,139 @@ def format_temperature(temperature: float) -> str:
     """
     return f"{temperature:.2f}°C"
 
-def main():
+class TimestampFormatter:
+    """
+    時間戳記格式化類別
+    
+    將 time.time_ns() 的時間戳記格式化為 "YYYY-MM-DD HH:MM:SS"（本地時間）。
+    同一分鐘內的 "YYYY-MM-DD HH:MM:" 前綴只以 strftime 計算一次並快取，
+    之後只需用整數運算補上秒數。時區偏移都是整分鐘，因此秒數與時區無關。
+    """
+    def __init__(self):
+        self._minute = None
+        self._prefix = ''
+
+    def format(self, timestamp_ns: int) -> str:
+        """
+        格式化時間戳記
+        
+        Args:
+            timestamp_ns (int): Unix 時間戳記（奈秒）
+            
+        Returns:
+            str: 格式化後的時間字串，例如 "2024-01-01 12:34:56"
+        """
+        minute, second = divmod(timestamp_ns // 1_000_000_000, 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._prefix = time.strftime('%Y-%m-%d %H:%M:', time.localtime(minute * 60))
+        return f"{self._prefix}{second:02d}"
+
+class OutputBuffer:
+    """
+    標準輸出緩衝類別
+    
+    將輸出的文字行累積在 bytearray 中，累積到指定行數或超過指定時間後，
+    以一次 os.write 直接寫入檔案描述子，取代每行都呼叫 print 並刷新標準輸出。
+    
+    屬性：
+        lines_per_flush: 累積多少行後寫出
+        flush_interval: 距離上次寫出超過多少秒後寫出
+    """
+    def __init__(self, lines_per_flush: int = 1, flush_interval: float = 1.0, fd: int = 1):
+        """
+        初始化輸出緩衝
+        
+        Args:
+            lines_per_flush (int): 累積多少行後寫出，預設為 1 行
+            flush_interval (float): 距離上次寫出超過多少秒後寫出，預設為 1 秒
+            fd (int): 輸出的檔案描述子，預設為標準輸出
+        """
+        self.lines_per_flush = lines_per_flush
+        self.flush_interval = flush_interval
+        self._fd = fd
+        self._buffer = bytearray()
+        self._lines = 0
+        self._last_flush = time.monotonic()
+
+    def write_line(self, line: str) -> None:
+        """
+        寫入一行文字，達到寫出條件時一併寫出
+        
+        Args:
+            line (str): 不含換行字元的文字
+        """
+        self._buffer += line.encode()
+        self._buffer += b'\n'
+        self._lines += 1
+        if (self._lines >= self.lines_per_flush
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        寫出所有緩衝中的內容
+        """
+        written = 0
+        with memoryview(self._buffer) as view:
+            while written < len(view):
+                with view[written:] as remaining:
+                    written += os.write(self._fd, remaining)
+        del self._buffer[:]
+        self._lines = 0
+        self._last_flush = time.monotonic()
+
+def main(interval: float = 1.0):
     """
     主程式
     
     建立溫度感測器實例並持續讀取溫度值。
-    每秒讀取一次溫度並顯示結果。
+    以固定頻率讀取溫度並顯示結果，讀取所花的時間會從等待時間中扣除，
+    因此取樣週期不會隨讀取時間漂移。
+    每次讀取後立即在背景執行緒觸發下一次溫度轉換，轉換在等待期間完成，
+    讀取前只需確認觸發已結束，不必再阻塞等待整個轉換時間。
+    輸出經由 OutputBuffer 累積，約每秒以一次系統呼叫寫出。
     可以通過 Ctrl+C 中斷程式執行。
+    
+    Args:
+        interval (float): 取樣週期（秒），預設為 1 秒
     """
     sensor = TemperatureSensor()
+    timestamp_formatter = TimestampFormatter()
+    # 取樣週期短於一秒時，累積一秒份的資料再寫出
+    output = OutputBuffer(lines_per_flush=max(1, int(1.0 / interval)))
+    # 觸發寫入可能阻塞到轉換完成，交由單一背景執行緒處理
+    trigger_executor = ThreadPoolExecutor(max_workers=1)
+    pending_trigger = None
     
     try:
+        next_tick = time.monotonic()
         while True:
+            # 讀取前等待上一次觸發結束，避免讀取與觸發爭用匯流排
+            if pending_trigger is not None:
+                pending_trigger.result()
             result = sensor.read_temperature_with_retry()
             if result is not None:
-                temperature, timestamp = result
-                print(f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] 目前溫度：{format_temperature(temperature)}")
+                temperature, timestamp_ns = result
+                output.write_line(f"[{timestamp_formatter.format(timestamp_ns)}] 目前溫度：{format_temperature(temperature)}")
+            else:
+                output.write_line("無法讀取溫度，請檢查感測器連接")
+            pending_trigger = trigger_executor.submit(sensor.trigger_conversion)
+            # 等到下一個取樣時間點；若讀取已超過一個週期則重新對齊
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
             else:
-                print("無法讀取溫度，請檢查感測器連接")
-            time.sleep(1)
+                next_tick = time.monotonic()
     except KeyboardInterrupt:
-        print("\n程式已停止")
+        output.write_line("\n程式已停止")
     except Exception as e:
         logger.error(f"程式執行時發生錯誤: {e}")
+    finally:
+        output.flush()
+        trigger_executor.shutdown(wait=True)
+        sensor.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 在導入 TemperatureSensor 之前先模擬 w1thermsensor，避免載入核心模組
+mock_w1thermsensor = MagicMock()
+with patch.dict(sys.modules, {'w1thermsensor': mock_w1thermsensor}):
+    import ds18
+    from ds18 import OutputBuffer, TemperatureSensor, TimestampFormatter
+
+SENSOR_ID = '28-000000000001'
+W1_SLAVE_CONTENT = (b'72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n'
+                    b'72 01 4b 46 7f ff 0e 10 57 t=23125\n')
+
+class TestTemperatureSensor(unittest.TestCase):
+    """DS18B20 溫度感測器測試類別"""
+
+    def setUp(self):
+        """以暫存目錄模擬 1-Wire 裝置目錄"""
+        devices_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(devices_dir.cleanup)
+        os.mkdir(os.path.join(devices_dir.name, SENSOR_ID))
+        self.device_path = os.path.join(devices_dir.name, SENSOR_ID, 'w1_slave')
+        self.write_device_file(W1_SLAVE_CONTENT)
+
+        patcher = patch.object(ds18, 'W1_DEVICES_DIR', devices_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        mock_w1thermsensor.reset_mock()
+        self.mock_sensor_class = mock_w1thermsensor.W1ThermSensor
+        self.mock_sensor_class.return_value.id = SENSOR_ID
+        patcher = patch.object(ds18, 'W1ThermSensor', self.mock_sensor_class)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sensor = TemperatureSensor()
+        self.addCleanup(self.sensor.close)
+        # 暫存目錄中的感測器目錄不是連結，因此匯流排目錄即為暫存目錄本身
+        self.bulk_read_path = os.path.join(os.path.realpath(devices_dir.name), 'therm_bulk_read')
+
+    def write_device_file(self, content):
+        """寫入模擬的 w1_slave 內容"""
+        with open(self.device_path, 'wb') as f:
+            f.write(content)
+
+    def test_read_temperature(self):
+        """測試讀取溫度"""
+        temperature, timestamp_ns = self.sensor.read_temperature()
+        self.assertAlmostEqual(temperature, 23.125)
+        self.assertIsInstance(timestamp_ns, int)
+
+    def test_read_temperature_reopens_after_os_error(self):
+        """測試讀取發生 OSError 後關閉檔案，下一次讀取重新開啟"""
+        with patch('os.preadv', side_effect=OSError(19, 'No such device')):
+            self.assertIsNone(self.sensor.read_temperature())
+        self.assertIsNone(self.sensor._fd)
+
+        temperature, _ = self.sensor.read_temperature()
+
+        self.assertAlmostEqual(temperature, 23.125)
+        self.assertEqual(self.mock_sensor_class.call_count, 2)
+
+    def test_read_temperature_waits_for_conversion(self):
+        """測試轉換進行中讀到空內容時等待轉換完成，而非視為 CRC 錯誤"""
+        real_preadv = os.preadv
+        empty_reads = [0, 0]
+        def preadv(fd, buffers, offset):
+            return empty_reads.pop() if empty_reads else real_preadv(fd, buffers, offset)
+        with patch('os.preadv', side_effect=preadv), patch('time.sleep') as mock_sleep:
+            temperature, _ = self.sensor.read_temperature()
+
+        self.assertAlmostEqual(temperature, 23.125)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertIsNotNone(self.sensor._fd)
+
+    def test_read_temperature_conversion_timeout(self):
+        """測試轉換一直未完成時讀取失敗"""
+        self.write_device_file(b'')
+        with patch.object(ds18, 'CONVERSION_TIMEOUT', 0), \
+                self.assertLogs(ds18.logger, 'ERROR') as logs:
+            self.assertIsNone(self.sensor.read_temperature())
+        self.assertIn("溫度轉換逾時", logs.output[0])
+
+    def test_read_temperature_rejects_empty_scratchpad(self):
+        """測試暫存器全為 0 時視為讀取失敗，而非 0.00°C"""
+        self.write_device_file(b'00 00 00 00 00 00 00 00 00 : crc=00 YES\n'
+                               b'00 00 00 00 00 00 00 00 00 t=0\n')
+        with self.assertLogs(ds18.logger, 'ERROR'):
+            self.assertIsNone(self.sensor.read_temperature())
+
+    def test_read_temperature_rejects_reset_value(self):
+        """測試上電重置值 85°C 視為讀取失敗"""
+        self.write_device_file(b'50 05 4b 46 7f ff 0c 10 1c : crc=1c YES\n'
+                               b'50 05 4b 46 7f ff 0c 10 1c t=85000\n')
+        with self.assertLogs(ds18.logger, 'ERROR'):
+            self.assertIsNone(self.sensor.read_temperature())
+
+    def test_read_temperature_with_retry_after_reset_value(self):
+        """測試讀到上電重置值後重試取得有效溫度"""
+        self.write_device_file(b'50 05 4b 46 7f ff 0c 10 1c : crc=1c YES\n'
+                               b'50 05 4b 46 7f ff 0c 10 1c t=85000\n')
+        def sleep(seconds):
+            self.write_device_file(W1_SLAVE_CONTENT)
+        with patch('time.sleep', side_effect=sleep), self.assertLogs(ds18.logger):
+            temperature, _ = self.sensor.read_temperature_with_retry()
+
+        self.assertAlmostEqual(temperature, 23.125)
+
+    def create_bulk_read_file(self):
+        """建立模擬的 therm_bulk_read 檔案"""
+        with open(self.bulk_read_path, 'wb'):
+            pass
+
+    def test_trigger_conversion(self):
+        """測試觸發溫度轉換時寫入 trigger"""
+        self.create_bulk_read_file()
+
+        self.assertTrue(self.sensor.trigger_conversion())
+
+        with open(self.bulk_read_path, 'rb') as f:
+            self.assertEqual(f.read(), b'trigger\n')
+
+    def test_trigger_conversion_unsupported(self):
+        """測試無法開啟 therm_bulk_read 時停用預先觸發，之後不再嘗試"""
+        with self.assertLogs(ds18.logger, 'WARNING'):
+            self.assertFalse(self.sensor.trigger_conversion())
+        self.assertIsNone(self.sensor.bulk_read_path)
+
+        self.create_bulk_read_file()
+        with self.assertNoLogs(ds18.logger, 'WARNING'):
+            self.assertFalse(self.sensor.trigger_conversion())
+        # 讀取仍照常進行
+        temperature, _ = self.sensor.read_temperature()
+        self.assertAlmostEqual(temperature, 23.125)
+
+    def test_initialize_sensor_reenables_trigger(self):
+        """測試重新初始化後恢復預先觸發溫度轉換"""
+        with self.assertLogs(ds18.logger, 'WARNING'):
+            self.sensor.trigger_conversion()
+        self.create_bulk_read_file()
+
+        self.assertTrue(self.sensor.initialize_sensor())
+
+        self.assertEqual(self.sensor.bulk_read_path, self.bulk_read_path)
+        self.assertTrue(self.sensor.trigger_conversion())
+
+class TestTimestampFormatter(unittest.TestCase):
+    """時間戳記格式化測試類別"""
+
+    def test_format_across_minute_boundary(self):
+        """測試跨越整分鐘時重新計算前綴，結果與 time.strftime 一致"""
+        formatter = TimestampFormatter()
+        # 1700000040 為整分鐘，依序為前一分鐘的 58、59 秒與下一分鐘的 0、1 秒
+        seconds = [1_700_000_038, 1_700_000_039, 1_700_000_040, 1_700_000_041]
+        with patch('time.strftime', wraps=time.strftime) as mock_strftime:
+            formatted = [formatter.format(second * 1_000_000_000 + 999_999_999)
+                         for second in seconds]
+            # 每分鐘只計算一次前綴
+            self.assertEqual(mock_strftime.call_count, 2)
+
+        self.assertEqual(formatted, [time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+                                     for second in seconds])
+
+class TestOutputBuffer(unittest.TestCase):
+    """輸出緩衝測試類別"""
+
+    def setUp(self):
+        """建立管線作為輸出目標"""
+        self.read_fd, self.write_fd = os.pipe()
+        self.addCleanup(os.close, self.read_fd)
+        self.addCleanup(os.close, self.write_fd)
+
+    def test_batches_lines(self):
+        """測試累積到指定行數才寫出"""
+        output = OutputBuffer(lines_per_flush=2, flush_interval=60, fd=self.write_fd)
+        with patch('os.write', wraps=os.write) as mock_write:
+            output.write_line("目前溫度：23.13°C")
+            mock_write.assert_not_called()
+            output.write_line("目前溫度：23.19°C")
+            mock_write.assert_called_once()
+
+        data = os.read(self.read_fd, 1024)
+        self.assertEqual(data.decode(), "目前溫度：23.13°C\n目前溫度：23.19°C\n")
+
+    def test_flush_after_interval(self):
+        """測試距離上次寫出超過指定時間後即寫出"""
+        output = OutputBuffer(lines_per_flush=10, flush_interval=0, fd=self.write_fd)
+        output.write_line("目前溫度：23.13°C")
+
+        data = os.read(self.read_fd, 1024)
+        self.assertEqual(data.decode(), "目前溫度：23.13°C\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
-from gpiozero import DistanceSensor
-import time
+import asyncio
+import numpy as np
+import os
+import pigpio
+import threading
 import logging
 
 # 設置日誌格式和級別
@@ -12,6 +15,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 安裝 numba 時將濾波器編譯為機器碼，未安裝時以一般 Python 函式執行
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# pigpio 的波形緩衝區與發送器由整個守護程式共用，同一時間只能有一組波形在建立或發送
+_wave_lock = threading.Lock()
+
+@njit(cache=True)
+def hampel_update(window, count, index, value, k):
+    """
+    Hampel 濾波器的單步更新
+    
+    將新測量值寫入環形緩衝區，並以視窗內的中位數與 MAD（中位數絕對偏差）
+    判斷新值是否為離群值。離群值以中位數取代，其餘維持原值。
+    
+    參數:
+        window (numpy.ndarray): 環形緩衝區，保存最近的原始測量值
+        count (int): 緩衝區中有效資料的數量（包含新值）
+        index (int): 新值寫入的位置
+        value (float): 新的測量值
+        k (float): 判定離群值的門檻，以標準差的倍數表示
+        
+    回傳:
+        float: 濾波後的測量值
+    """
+    window[index] = value
+    filled = window[:count]
+    median = np.median(filled)
+    # 1.4826 將 MAD 換算為常態分布下的標準差估計
+    sigma = 1.4826 * np.median(np.abs(filled - median))
+    if np.abs(value - median) > k * sigma:
+        return median
+    return value
+
 class HCSR04:
     """
     HC-SR04 超音波距離感測器類別
@@ -19,12 +61,29 @@ class HCSR04:
     這個類別封裝了 HC-SR04 超音波感測器的基本功能，包括：
     - 初始化感測器
     - 測量單次距離
-    - 計算多次測量的平均值
+    - 計算多次測量的中位數
+    - 以 Hampel 濾波器連續濾除離群的測量值
     - 安全關閉感測器
     
-    使用 gpiozero 庫來控制 GPIO 腳位，簡化了底層操作。
+    使用 pigpio 庫來控制 GPIO 腳位。回波脈衝的寬度由 pigpio 守護程式
+    以硬體時間戳記計算，Python 端只在脈衝結束時收到一次回呼，不需要輪詢腳位。
+    多次測量時，所有 Trigger 脈衝與間隔預先編成一個 pigpio 波形，
+    由守護程式以 DMA 一次送出，Python 端只需等待全部回波收齊。
     """
     
+    # 聲速 343 公尺/秒，來回距離減半後每微秒對應 0.01715 公分
+    CM_PER_MICROSECOND = 0.01715
+    # Trigger 脈衝寬度（微秒）
+    TRIGGER_PULSE_US = 10
+    # 等待回波的逾時時間（秒）
+    # 前方沒有障礙物時，感測器會將 Echo 維持高電位約 38 毫秒，逾時時間需大於此值
+    ECHO_TIMEOUT = 0.05
+    # 最大測量距離（公分），超過時（包含沒有障礙物的約 38 毫秒回波）回傳此值
+    MAX_DISTANCE = 400
+    # Hampel 濾波器的視窗大小與離群值門檻（標準差倍數）
+    FILTER_WINDOW = 7
+    FILTER_THRESHOLD = 3.0
+    
     def __init__(self, trigger_pin=23, echo_pin=24):
         """
         初始化 HC-SR04 感測器
@@ -38,18 +97,73 @@ class HCSR04:
         注意事項:
             - 使用 BCM 編號而不是物理腳位編號
             - 確保腳位連接正確，避免短路
+            - 需要先啟動 pigpio 守護程式（sudo pigpiod）
         """
         try:
-            # 創建 DistanceSensor 實例，使用指定的 GPIO 腳位
-            self.sensor = DistanceSensor(
-                trigger=trigger_pin,
-                echo=echo_pin
-            )
+            # 連接 pigpio 守護程式
+            self.pi = pigpio.pi()
+            if not self.pi.connected:
+                raise RuntimeError("無法連接 pigpio 守護程式，請先執行 sudo pigpiod")
+            self.trigger_pin = trigger_pin
+            self.echo_pin = echo_pin
+            self.pi.set_mode(trigger_pin, pigpio.OUTPUT)
+            self.pi.write(trigger_pin, 0)
+            self.pi.set_mode(echo_pin, pigpio.INPUT)
+            
+            # 回波上升沿的時間戳記
+            self._rise_tick = None
+            # 回波脈衝寬度（微秒）的緩衝區，由回呼依序填入並重複使用
+            self._pulse_widths = np.empty(3, dtype=np.float64)
+            # 本次測量預計收到的回波數與已收到的回波數
+            self._pulse_target = 0
+            self._pulse_count = 0
+            # 收齊所有回波時設定
+            self._echo_event = threading.Event()
+            # Hampel 濾波器的環形緩衝區、有效資料數與下一個寫入位置
+            self._filter_window = np.empty(self.FILTER_WINDOW, dtype=np.float64)
+            self._filter_count = 0
+            self._filter_index = 0
+            # 在 Echo 腳位的上升沿與下降沿都觸發回呼
+            self._callback = self.pi.callback(echo_pin, pigpio.EITHER_EDGE, self._on_echo_edge)
             logger.info(f"HC-SR04 感測器初始化成功 (Trigger: {trigger_pin}, Echo: {echo_pin})")
         except Exception as e:
             logger.error(f"HC-SR04 感測器初始化失敗: {str(e)}")
             raise
     
+    def _on_echo_edge(self, gpio, level, tick):
+        """
+        Echo 腳位電位變化的回呼函式，由 pigpio 的回呼執行緒呼叫
+        
+        參數:
+            gpio (int): 觸發的腳位
+            level (int): 新的電位，1 為上升沿，0 為下降沿
+            tick (int): pigpio 的微秒時間戳記
+        """
+        if level == 1:
+            self._rise_tick = tick
+        elif level == 0 and self._rise_tick is not None:
+            if self._pulse_count < self._pulse_target:
+                # tickDiff 會處理時間戳記的 32 位元溢位
+                self._pulse_widths[self._pulse_count] = pigpio.tickDiff(self._rise_tick, tick)
+                self._pulse_count += 1
+                if self._pulse_count == self._pulse_target:
+                    self._echo_event.set()
+            self._rise_tick = None
+    
+    def _start_capture(self, samples):
+        """
+        準備接收指定數量的回波
+        
+        參數:
+            samples (int): 預計收到的回波數
+        """
+        if len(self._pulse_widths) < samples:
+            self._pulse_widths = np.empty(samples, dtype=np.float64)
+        self._echo_event.clear()
+        self._rise_tick = None
+        self._pulse_count = 0
+        self._pulse_target = samples
+    
     def get_distance(self):
         """
         測量單次距離
@@ -58,14 +172,18 @@ class HCSR04:
             float: 測得的距離，單位為公分
             
         注意事項:
-            - 返回的距離值已經從公尺轉換為公分
             - 測量範圍通常在 2-400 公分之間
-            - 超出範圍的測量可能不準確
+            - 超出範圍（包含前方沒有障礙物）時回傳 MAX_DISTANCE
+            - 在 ECHO_TIMEOUT 內完全沒有回波脈衝時（例如接線異常）會拋出 TimeoutError
         """
         try:
-            # 使用 gpiozero 的 distance 屬性獲取距離（單位：公尺）
-            # 乘以 100 轉換為公分
-            distance = self.sensor.distance * 100
+            self._start_capture(1)
+            # 由 pigpio 送出 10 微秒的 Trigger 脈衝
+            self.pi.gpio_trigger(self.trigger_pin, self.TRIGGER_PULSE_US, 1)
+            if not self._echo_event.wait(self.ECHO_TIMEOUT):
+                raise TimeoutError("等待回波逾時")
+            # 回波脈衝寬度（微秒）換算為公分，超出範圍時限制為最大測量距離
+            distance = min(self._pulse_widths[0] * self.CM_PER_MICROSECOND, self.MAX_DISTANCE)
             logger.debug(f"測量距離: {distance:.2f} 公分")
             return distance
         except Exception as e:
@@ -74,38 +192,109 @@ class HCSR04:
     
     def get_average_distance(self, samples=3, delay=0.1):
         """
-        進行多次測量並回傳平均值，以獲得更穩定的結果
+        進行多次測量並回傳中位數，以獲得更穩定的結果
         
         參數:
             samples (int): 測量次數，預設為 3
-                - 建議使用奇數次測量，避免極端值影響
+                - 建議使用奇數次測量，中位數會是實際測得的值
             delay (float): 每次測量之間的延遲時間（秒），預設為 0.1
                 - 給予感測器足夠的恢復時間
                 
         回傳:
-            float: 平均距離，單位為公分
+            float: 距離的中位數，單位為公分
             
         注意事項:
             - 多次測量可以減少單次測量的誤差
+            - 使用中位數而非算術平均，偶發的錯誤回波不會拉偏結果
             - 延遲時間過短可能影響測量準確性
+            - 間隔由 pigpio 波形精確控制，不受 Python 排程延遲影響
+            - pigpio 波形為守護程式共用資源，多個感測器的波形測量會依序執行而非同時進行
+            - 部分回波遺失時以收到的測量值計算，完全沒有回波時拋出 TimeoutError
         """
         try:
-            distances = []
+            self._start_capture(samples)
+            
+            # 將所有 Trigger 脈衝與間隔編成一個波形：拉高 10 微秒後拉低並等待 delay
+            trigger_mask = 1 << self.trigger_pin
+            delay_us = int(delay * 1_000_000)
+            pulses = []
             for i in range(samples):
-                distance = self.get_distance()
-                distances.append(distance)
-                logger.debug(f"第 {i+1} 次測量: {distance:.2f} 公分")
-                if i < samples - 1:  # 最後一次測量後不需要延遲
-                    time.sleep(delay)
+                pulses.append(pigpio.pulse(trigger_mask, 0, self.TRIGGER_PULSE_US))
+                # 最後一次測量後不需要延遲
+                pulses.append(pigpio.pulse(0, trigger_mask, delay_us if i < samples - 1 else 0))
+            with _wave_lock:
+                self.pi.wave_add_generic(pulses)
+                wave_id = self.pi.wave_create()
+                try:
+                    self.pi.wave_send_once(wave_id)
+                    # 最後一次 Trigger 之後再等待 ECHO_TIMEOUT，
+                    # 讓沒有障礙物時約 38 毫秒的回波也能完整收到
+                    wave_duration = (samples - 1) * delay + samples * self.TRIGGER_PULSE_US / 1_000_000
+                    self._echo_event.wait(wave_duration + self.ECHO_TIMEOUT)
+                finally:
+                    if self.pi.wave_tx_busy():
+                        self.pi.wave_tx_stop()
+                    self.pi.wave_delete(wave_id)
             
-            # 計算所有測量值的平均值
-            average = sum(distances) / len(distances)
-            logger.info(f"平均距離: {average:.2f} 公分 (共 {samples} 次測量)")
-            return average
+            count = self._pulse_count
+            if count == 0:
+                raise TimeoutError("等待回波逾時")
+            if count < samples:
+                logger.warning(f"部分回波遺失，僅收到 {count}/{samples} 次測量")
+            
+            # 計算所有測量值的中位數，並將脈衝寬度（微秒）換算為公分，超出範圍時限制為最大測量距離
+            median = min(float(np.median(self._pulse_widths[:count])) * self.CM_PER_MICROSECOND,
+                         self.MAX_DISTANCE)
+            logger.info(f"中位數距離: {median:.2f} 公分 (共 {count} 次測量)")
+            return median
         except Exception as e:
             logger.error(f"平均距離計算失敗: {str(e)}")
             raise
     
+    def get_filtered_distance(self):
+        """
+        測量單次距離並以 Hampel 濾波器濾除離群值
+        
+        每次呼叫進行一次測量，並與最近 FILTER_WINDOW 次的測量值比較。
+        偏離中位數超過 FILTER_THRESHOLD 倍標準差的測量值會以中位數取代，
+        適合高頻率連續測距（例如避障）時使用。
+        
+        回傳:
+            float: 濾波後的距離，單位為公分
+            
+        注意事項:
+            - 安裝 numba 時濾波器會被編譯，第一次呼叫需要額外的編譯時間
+        """
+        try:
+            distance = self.get_distance()
+            self._filter_count = min(self._filter_count + 1, self.FILTER_WINDOW)
+            filtered = float(hampel_update(self._filter_window, self._filter_count,
+                                           self._filter_index, distance, self.FILTER_THRESHOLD))
+            self._filter_index = (self._filter_index + 1) % self.FILTER_WINDOW
+            if filtered != distance:
+                logger.debug(f"濾除離群值: {distance:.2f} 公分 -> {filtered:.2f} 公分")
+            return filtered
+        except Exception as e:
+            logger.error(f"濾波距離測量失敗: {str(e)}")
+            raise
+    
+    async def sample(self, samples=3, delay=0.1):
+        """
+        非同步進行多次測量並回傳中位數
+        
+        在執行緒池中執行 get_average_distance()，
+        讓測量期間的等待可以與其他感測器的讀取重疊。
+        
+        參數:
+            samples (int): 測量次數，預設為 3
+            delay (float): 每次測量之間的延遲時間（秒），預設為 0.1
+                
+        回傳:
+            float: 距離的中位數，單位為公分
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_average_distance, samples, delay)
+    
     def close(self):
         """
         安全關閉感測器
@@ -116,28 +305,76 @@ class HCSR04:
             - 確保感測器正確關閉，避免硬體損壞
         """
         try:
-            self.sensor.close()
+            self._callback.cancel()
+            self.pi.stop()
             logger.info("HC-SR04 感測器已關閉")
         except Exception as e:
             logger.error(f"關閉感測器失敗: {str(e)}")
             raise
 
-if __name__ == "__main__":
-    # 範例使用程式碼
+def enable_realtime_scheduling(priority=50):
+    """
+    將目前執行緒切換為 SCHED_FIFO 即時排程
+    
+    即時排程的執行緒在可執行時會優先於一般行程，
+    縮短回波回呼與測量結果被處理前的排程延遲。
+    
+    參數:
+        priority (int): SCHED_FIFO 優先權 (1-99)，預設為 50
+        
+    回傳:
+        bool: 是否成功切換
+        
+    注意事項:
+        - 需要 root 權限或 CAP_SYS_NICE
+        - 只影響目前執行緒與之後建立的執行緒，
+          因此應在建立 HCSR04（pigpio 回呼執行緒）之前呼叫
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        logger.info(f"已啟用 SCHED_FIFO 即時排程 (優先權: {priority})")
+        return True
+    except (AttributeError, OSError) as e:
+        logger.warning(f"無法啟用即時排程，將使用一般排程: {str(e)}")
+        return False
+
+async def main():
+    """
+    範例使用程式碼
+    
+    測量與每秒一次的等待同時進行，更新週期為兩者中較長者，而非兩者相加。
+    測量在 SCHED_FIFO 即時排程下進行，等待期間則讓出 CPU 給其他行程。
+    完全沒有收到回波時顯示無法取得讀數並繼續測量，不會中止迴圈。
+    """
+    # 在建立感測器前切換排程，讓 pigpio 回呼執行緒與測量執行緒一併使用即時排程
+    enable_realtime_scheduling()
     # 創建感測器實例
     sensor = HCSR04()
     try:
         # 持續測量距離
         while True:
-            # 使用平均測量來獲得更穩定的結果
+            # 使用多次測量來獲得更穩定的結果
             # samples=5: 進行 5 次測量
             # delay=0.1: 每次測量間隔 0.1 秒
-            dist = sensor.get_average_distance(samples=5, delay=0.1)
-            print(f"距離：{dist:.2f} 公分")
-            time.sleep(1)  # 每秒更新一次測量結果
+            # return_exceptions=True：測量失敗時仍等待滿一秒，維持更新週期
+            dist, _ = await asyncio.gather(
+                sensor.sample(samples=5, delay=0.1),
+                asyncio.sleep(1),  # 每秒更新一次測量結果
+                return_exceptions=True
+            )
+            if isinstance(dist, TimeoutError):
+                print("距離：無法取得讀數（沒有收到回波）")
+            elif isinstance(dist, BaseException):
+                raise dist
+            else:
+                print(f"距離：{dist:.2f} 公分")
+    finally:
+        # 確保感測器被正確關閉
+        sensor.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         # 當使用者按下 Ctrl+C 時，優雅地結束程式
         print("\n程式已停止")
-    finally:
-        # 確保感測器被正確關閉
-        sensor.close() 
\ No newline at end of file
@@ -1,62 +1,240 @@
 #!/usr/bin/env python3
+import asyncio
+import itertools
 import unittest
 from unittest.mock import MagicMock, patch
 import time
 
-# 在導入 HCSR04 之前先模擬 DistanceSensor
-mock_distance_sensor = MagicMock()
-with patch('gpiozero.DistanceSensor', mock_distance_sensor):
-    from hcsr04 import HCSR04
+import pigpio
+import hcsr04
+from hcsr04 import HCSR04, enable_realtime_scheduling
+
+# 模擬 pigpio.pi，避免連接真正的 pigpio 守護程式
+mock_pigpio_pi = MagicMock()
 
 class TestHCSR04(unittest.TestCase):
     """HC-SR04 感測器測試類別"""
-    
+
     def setUp(self):
         """設置測試環境"""
         # 重置 mock
-        mock_distance_sensor.reset_mock()
-        
-        # 設置模擬感測器
-        self.mock_sensor = MagicMock()
-        self.mock_sensor.distance = 1.0
-        mock_distance_sensor.return_value = self.mock_sensor
-        
+        mock_pigpio_pi.reset_mock()
+
+        # 設置模擬的 pigpio 連線
+        self.mock_pi = MagicMock()
+        self.mock_pi.connected = True
+        self.mock_pi.wave_tx_busy.return_value = 0
+        mock_pigpio_pi.return_value = self.mock_pi
+        patcher = patch('pigpio.pi', mock_pigpio_pi)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         # 創建感測器實例
         self.hcsr04 = HCSR04()
-    
+
+    def set_echo_pulses(self, pulse_widths):
+        """設定每次 Trigger 後依序模擬回傳的回波脈衝寬度（微秒）"""
+        pulse_widths = iter(pulse_widths)
+        def fire_echo():
+            pulse_width = next(pulse_widths)
+            self.hcsr04._on_echo_edge(24, 1, 1000)
+            self.hcsr04._on_echo_edge(24, 0, 1000 + pulse_width)
+        def fire_wave(wave_id):
+            # 波形中每個 Trigger 脈衝都產生一次回波
+            pulses = self.mock_pi.wave_add_generic.call_args[0][0]
+            for _ in range(len(pulses) // 2):
+                fire_echo()
+        self.mock_pi.gpio_trigger.side_effect = lambda *args: fire_echo()
+        self.mock_pi.wave_send_once.side_effect = fire_wave
+
+    def set_echo_pulse(self, pulse_width):
+        """設定每次 Trigger 後模擬回傳的回波脈衝寬度（微秒）"""
+        self.set_echo_pulses(itertools.repeat(pulse_width))
+
     def test_initialization(self):
         """測試初始化"""
-        mock_distance_sensor.assert_called_once_with(
-            trigger=23,
-            echo=24
+        mock_pigpio_pi.assert_called_once_with()
+        self.mock_pi.set_mode.assert_any_call(23, pigpio.OUTPUT)
+        self.mock_pi.set_mode.assert_any_call(24, pigpio.INPUT)
+        self.mock_pi.callback.assert_called_once_with(
+            24, pigpio.EITHER_EDGE, self.hcsr04._on_echo_edge
         )
-    
+
+    def test_initialization_not_connected(self):
+        """測試無法連接 pigpio 守護程式時初始化失敗"""
+        self.mock_pi.connected = False
+        with self.assertRaises(RuntimeError):
+            HCSR04()
+
     def test_get_distance(self):
         """測試單次距離測量"""
-        # 設置模擬回傳值
-        self.mock_sensor.distance = 0.5  # 50 公分
-        
+        # 設置模擬回波：1000 微秒約為 17.15 公分
+        self.set_echo_pulse(1000)
+
         # 測試距離測量
         distance = self.hcsr04.get_distance()
-        self.assertEqual(distance, 50.0)
-    
+        self.mock_pi.gpio_trigger.assert_called_once_with(23, 10, 1)
+        self.assertAlmostEqual(distance, 17.15)
+
+    def test_get_distance_timeout(self):
+        """測試沒有回波時的逾時處理"""
+        with self.assertRaises(TimeoutError):
+            self.hcsr04.get_distance()
+
+    def test_get_distance_out_of_range(self):
+        """測試前方沒有障礙物時回傳最大測量距離"""
+        # 沒有障礙物時 Echo 維持高電位約 38 毫秒
+        self.set_echo_pulse(38000)
+
+        self.assertEqual(self.hcsr04.get_distance(), HCSR04.MAX_DISTANCE)
+        self.assertEqual(self.hcsr04.get_filtered_distance(), HCSR04.MAX_DISTANCE)
+
+    def test_echo_timeout_covers_no_obstacle_pulse(self):
+        """測試逾時時間大於沒有障礙物時約 38 毫秒的回波"""
+        self.assertGreater(HCSR04.ECHO_TIMEOUT, 0.038)
+
     def test_get_average_distance(self):
         """測試多次距離測量平均值"""
-        # 設置模擬回傳值
-        self.mock_sensor.distance = 0.3  # 30 公分
-        
+        # 設置模擬回波
+        self.set_echo_pulse(2000)  # 34.3 公分
+
         # 測試平均距離
         with patch('time.sleep') as mock_sleep:
-            average = self.hcsr04.get_average_distance(samples=3)
-            # 在 3 個樣本之間需要 3 次延遲
-            self.assertEqual(mock_sleep.call_count, 3)
-        
-        self.assertEqual(average, 30.0)
-    
+            average = self.hcsr04.get_average_distance(samples=3, delay=0.1)
+            # 間隔由波形控制，不需要呼叫 time.sleep
+            mock_sleep.assert_not_called()
+
+        self.assertAlmostEqual(average, 34.3)
+        # 3 個 Trigger 脈衝，樣本之間有 2 次 100000 微秒的間隔
+        pulses = self.mock_pi.wave_add_generic.call_args[0][0]
+        self.assertEqual(len(pulses), 6)
+        self.assertEqual([pulse.delay for pulse in pulses], [10, 100000, 10, 100000, 10, 0])
+        self.mock_pi.wave_send_once.assert_called_once_with(self.mock_pi.wave_create.return_value)
+        self.mock_pi.wave_delete.assert_called_once_with(self.mock_pi.wave_create.return_value)
+
+    def test_get_average_distance_missing_echo(self):
+        """測試部分回波遺失時以收到的測量值計算"""
+        def fire_wave(wave_id):
+            self.hcsr04._on_echo_edge(24, 1, 1000)
+            self.hcsr04._on_echo_edge(24, 0, 2000)
+        self.mock_pi.wave_send_once.side_effect = fire_wave
+
+        average = self.hcsr04.get_average_distance(samples=3, delay=0.001)
+        self.assertAlmostEqual(average, 17.15)
+
+    def test_get_average_distance_timeout(self):
+        """測試完全沒有回波時的逾時處理"""
+        with self.assertRaises(TimeoutError):
+            self.hcsr04.get_average_distance(samples=3, delay=0.001)
+
+    def test_get_average_distance_out_of_range(self):
+        """測試前方沒有障礙物時等待最後一次約 38 毫秒的回波並回傳最大測量距離"""
+        self.set_echo_pulse(38000)
+
+        with patch.object(self.hcsr04._echo_event, 'wait',
+                          wraps=self.hcsr04._echo_event.wait) as mock_wait, \
+                self.assertNoLogs(hcsr04.logger, 'WARNING'):
+            average = self.hcsr04.get_average_distance(samples=5, delay=0.1)
+
+        self.assertEqual(average, HCSR04.MAX_DISTANCE)
+        # 最後一次 Trigger 在 0.4 秒後送出，之後至少等待 38 毫秒
+        self.assertGreater(mock_wait.call_args[0][0], 0.4 + 0.038)
+
+    def test_get_average_distance_rejects_outlier(self):
+        """測試中位數不受單次異常測量影響"""
+        self.set_echo_pulses([1000, 1000, 20000, 1000, 1000])
+
+        average = self.hcsr04.get_average_distance(samples=5)
+
+        self.assertAlmostEqual(average, 17.15)
+
+    def test_get_filtered_distance(self):
+        """測試 Hampel 濾波器以中位數取代離群值"""
+        self.set_echo_pulses([1000, 1010, 990, 1000, 20000, 1005])
+
+        distances = [self.hcsr04.get_filtered_distance() for _ in range(6)]
+
+        # 前四次與最後一次為正常值，維持原值
+        self.assertAlmostEqual(distances[0], 17.15)
+        self.assertAlmostEqual(distances[5], 1005 * 0.01715)
+        # 第五次的離群值被取代為視窗中位數
+        self.assertAlmostEqual(distances[4], 1000 * 0.01715)
+
+    def test_sample(self):
+        """測試非同步測量"""
+        self.set_echo_pulse(1000)
+
+        distance = asyncio.run(self.hcsr04.sample(samples=3))
+
+        self.assertAlmostEqual(distance, 17.15)
+
+    def test_concurrent_sample_serializes_waveforms(self):
+        """測試兩個感測器同時測量時波形依序建立、發送與刪除"""
+        events = []
+        def make_pi(name):
+            pi = MagicMock()
+            pi.connected = True
+            pi.wave_tx_busy.return_value = 0
+            pi.wave_add_generic.side_effect = lambda pulses: events.append((name, 'add'))
+            pi.wave_create.side_effect = lambda: events.append((name, 'create')) or 0
+            pi.wave_delete.side_effect = lambda wave_id: events.append((name, 'delete'))
+            return pi
+        first_pi, second_pi = make_pi('first'), make_pi('second')
+        mock_pigpio_pi.side_effect = [first_pi, second_pi]
+        self.addCleanup(setattr, mock_pigpio_pi, 'side_effect', None)
+        sensors = [HCSR04(), HCSR04(trigger_pin=17, echo_pin=27)]
+        for name, pi, sensor in zip(('first', 'second'), (first_pi, second_pi), sensors):
+            def fire_wave(wave_id, name=name, sensor=sensor):
+                events.append((name, 'send'))
+                # 保留時間讓另一個執行緒有機會插入
+                time.sleep(0.01)
+                sensor._on_echo_edge(sensor.echo_pin, 1, 1000)
+                sensor._on_echo_edge(sensor.echo_pin, 0, 2000)
+            pi.wave_send_once.side_effect = fire_wave
+
+        async def sample_both():
+            return await asyncio.gather(*(sensor.sample(samples=1) for sensor in sensors))
+
+        distances = asyncio.run(sample_both())
+
+        self.assertEqual(len(distances), 2)
+        for distance in distances:
+            self.assertAlmostEqual(distance, 17.15)
+        self.assertEqual(len(events), 8)
+        for start in (0, 4):
+            name = events[start][0]
+            self.assertEqual(events[start:start + 4],
+                             [(name, 'add'), (name, 'create'), (name, 'send'), (name, 'delete')])
+
+    def test_main_continues_after_timeout(self):
+        """測試範例程式在沒有回波時顯示無法取得讀數並繼續測量"""
+        class StopLoop(Exception):
+            pass
+        printed = []
+        def fake_print(line):
+            printed.append(line)
+            if len(printed) == 2:
+                raise StopLoop
+        with patch.object(HCSR04, 'sample', side_effect=[TimeoutError("等待回波逾時"), 17.15]), \
+                patch('asyncio.sleep'), \
+                patch.object(hcsr04, 'enable_realtime_scheduling'), \
+                patch('builtins.print', side_effect=fake_print):
+            with self.assertRaises(StopLoop):
+                asyncio.run(hcsr04.main())
+
+        self.assertEqual(printed, ["距離：無法取得讀數（沒有收到回波）", "距離：17.15 公分"])
+
+    @patch('os.sched_setscheduler', side_effect=PermissionError)
+    def test_enable_realtime_scheduling_without_permission(self, mock_setscheduler):
+        """測試沒有權限時退回一般排程"""
+        self.assertFalse(enable_realtime_scheduling())
+        mock_setscheduler.assert_called_once()
+
     def test_close(self):
         """測試感測器關閉功能"""
         self.hcsr04.close()
-        self.mock_sensor.close.assert_called_once()
+        self.mock_pi.callback.return_value.cancel.assert_called_once()
+        self.mock_pi.stop.assert_called_once()
 
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main()
@@ -1,19 +1,52 @@
+import lgpio
+
 class RelayModule:
-    def __init__(self, pin):
-        import RPi.GPIO as GPIO
-        self.GPIO = GPIO
+    # 每個 GPIO 晶片只開啟一次，所有繼電器共用 handle 並記錄使用數量
+    _chip_handles = {}
+    _chip_users = {}
+
+    def __init__(self, pin, chip=0):
+        # 透過 /dev/gpiochipN 字元裝置控制 GPIO
         self.pin = pin
-        self.GPIO.setmode(self.GPIO.BCM)
-        self.GPIO.setup(self.pin, self.GPIO.OUT)
+        self.chip = chip
+        self._handle = self._acquire_chip(chip)
+        try:
+            lgpio.gpio_claim_output(self._handle, self.pin, 0)
+        except Exception:
+            self._release_chip(chip)
+            self._handle = None
+            raise
+
+    @classmethod
+    def _acquire_chip(cls, chip):
+        if chip not in cls._chip_handles:
+            cls._chip_handles[chip] = lgpio.gpiochip_open(chip)
+            cls._chip_users[chip] = 0
+        cls._chip_users[chip] += 1
+        return cls._chip_handles[chip]
+
+    @classmethod
+    def _release_chip(cls, chip):
+        cls._chip_users[chip] -= 1
+        if cls._chip_users[chip] == 0:
+            lgpio.gpiochip_close(cls._chip_handles.pop(chip))
+            del cls._chip_users[chip]
 
     def on(self):
-        self.GPIO.output(self.pin, self.GPIO.HIGH)
+        lgpio.gpio_write(self._handle, self.pin, 1)
 
     def off(self):
-        self.GPIO.output(self.pin, self.GPIO.LOW)
+        lgpio.gpio_write(self._handle, self.pin, 0)
 
     def cleanup(self):
-        self.GPIO.cleanup()
+        # 每個實例只釋放一次晶片參照，重複呼叫不會影響其他繼電器
+        if self._handle is None:
+            return
+        try:
+            lgpio.gpio_free(self._handle, self.pin)
+        finally:
+            self._handle = None
+            self._release_chip(self.chip)
 
 if __name__ == '__main__':
     import time
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 在導入 RelayModule 之前先模擬 lgpio
+mock_lgpio = MagicMock()
+with patch.dict(sys.modules, {'lgpio': mock_lgpio}):
+    from jqc import RelayModule
+
+class TestRelayModule(unittest.TestCase):
+    """繼電器模組測試類別"""
+
+    def setUp(self):
+        """設置測試環境"""
+        # 重置 mock 與共用的晶片 handle
+        mock_lgpio.reset_mock()
+        mock_lgpio.gpio_free.side_effect = None
+        mock_lgpio.gpiochip_open.return_value = 7
+        RelayModule._chip_handles.clear()
+        RelayModule._chip_users.clear()
+
+    def test_shares_chip_handle(self):
+        """測試多個繼電器共用同一個晶片 handle"""
+        relay_a = RelayModule(17)
+        relay_b = RelayModule(27)
+        mock_lgpio.gpiochip_open.assert_called_once_with(0)
+
+        relay_a.cleanup()
+        mock_lgpio.gpiochip_close.assert_not_called()
+        relay_b.cleanup()
+        mock_lgpio.gpiochip_close.assert_called_once_with(7)
+
+    def test_double_cleanup(self):
+        """測試重複呼叫 cleanup 不會關閉其他繼電器使用中的晶片"""
+        relay_a = RelayModule(17)
+        relay_b = RelayModule(27)
+
+        relay_a.cleanup()
+        relay_a.cleanup()
+        mock_lgpio.gpio_free.assert_called_once_with(7, 17)
+        mock_lgpio.gpiochip_close.assert_not_called()
+
+        relay_b.on()
+        mock_lgpio.gpio_write.assert_called_once_with(7, 27, 1)
+        relay_b.cleanup()
+        mock_lgpio.gpiochip_close.assert_called_once_with(7)
+
+    def test_cleanup_releases_chip_when_free_fails(self):
+        """測試釋放腳位失敗時仍會釋放晶片參照"""
+        relay = RelayModule(17)
+        mock_lgpio.gpio_free.side_effect = RuntimeError("free failed")
+
+        with self.assertRaises(RuntimeError):
+            relay.cleanup()
+        mock_lgpio.gpiochip_close.assert_called_once_with(7)
+        self.assertEqual(RelayModule._chip_users, {})
+
+if __name__ == '__main__':
+    unittest.main()
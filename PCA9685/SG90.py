@@ -1,21 +1,49 @@
+import asyncio
+import atexit
+import queue
+import struct
 import time
+from array import array
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from board import SCL, SDA
 import busio
 from adafruit_pca9685 import PCA9685
-from typing import Optional
-
-# 配置日誌記錄
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sg90.log'),
-        logging.StreamHandler()
-    ]
-)
+from typing import Dict, Iterable, Optional
+
 logger = logging.getLogger('SG90')
 
+def configure_logging(log_file: str = 'sg90.log', level: int = logging.INFO) -> Optional[QueueListener]:
+    """
+    配置日誌記錄，由執行程式（__main__ 或應用程式）呼叫
+
+    日誌的時間格式化與檔案、終端機輸出都由 QueueListener 的背景執行緒處理，
+    記錄日誌時只需合併訊息並放入佇列，不會因格式化或 SD 卡寫入而阻塞控制迴圈。
+    根日誌記錄器已有處理器時不做任何設定，避免建立不會被使用的背景執行緒與日誌檔。
+
+    Args:
+        log_file (str): 日誌檔路徑，預設為 sg90.log
+        level (int): 日誌等級，預設為 logging.INFO
+
+    Returns:
+        Optional[QueueListener]: 已啟動的 QueueListener，根日誌記錄器已配置時返回 None
+    """
+    if logging.getLogger().handlers:
+        return None
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    # QueueHandler 只合併訊息與參數，完整格式交由背景執行緒的處理器套用
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=level, handlers=[queue_handler])
+    return listener
+
 class SG90:
     # 常數定義
     DEFAULT_FREQUENCY = 50  # Hz
@@ -25,14 +53,35 @@ class SG90:
     MAX_PULSE_WIDTH = 2000  # 微秒 (90度)
     PULSE_PERIOD = 20000    # 微秒 (50Hz 週期)
     MAX_DUTY_CYCLE = 65535  # PCA9685 16位元最大值
+    LED0_ON_L = 0x06        # 通道 0 的 LED_ON_L 暫存器位址
+    CHANNEL_REGISTER_SIZE = 4  # 每個通道的 LED_ON_L/H、LED_OFF_L/H 共 4 個暫存器
+    STEPS_PER_DEGREE = 2    # 查表與軌跡的角度解析度 (0.5度)
+
+    # duty cycle 的定點數運算常數：
+    # duty = MIN_PULSE_WIDTH * MAX_DUTY_CYCLE / PULSE_PERIOD
+    #        + angle * (MAX_PULSE_WIDTH - MIN_PULSE_WIDTH) * MAX_DUTY_CYCLE / (MAX_ANGLE * PULSE_PERIOD)
+    # 角度以 24 位元小數的定點數表示，結果以 48 位元小數計算後右移取整數部分，
+    # 所有中間值都小於 2**62
+    _ANGLE_FRACTION_BITS = 24
+    _DUTY_FRACTION_BITS = 48
+    _DUTY_OFFSET = ((MIN_PULSE_WIDTH * MAX_DUTY_CYCLE << _DUTY_FRACTION_BITS)
+                    + PULSE_PERIOD // 2) // PULSE_PERIOD
+    _DUTY_SLOPE = (((MAX_PULSE_WIDTH - MIN_PULSE_WIDTH) * MAX_DUTY_CYCLE
+                    << (_DUTY_FRACTION_BITS - _ANGLE_FRACTION_BITS))
+                   + MAX_ANGLE * PULSE_PERIOD // 2) // (MAX_ANGLE * PULSE_PERIOD)
 
-    def __init__(self, channel: int = 0, frequency: int = DEFAULT_FREQUENCY):
+    def __init__(self, channel: int = 0, frequency: int = DEFAULT_FREQUENCY,
+                 pca: Optional[PCA9685] = None):
         """
         初始化 SG90 伺服馬達控制器
 
         Args:
             channel (int): PCA9685 的通道號碼 (0-15)
             frequency (int): PWM 頻率，預設為 50Hz
+            pca (Optional[PCA9685]): 多個伺服馬達共用的 PCA9685 控制器。
+                未提供時會自行建立 I2C 匯流排與 PCA9685；
+                提供時直接使用，不會重新設定頻率（傳入的 frequency 會被忽略），
+                也不會在 cleanup 時釋放
 
         Raises:
             ValueError: 當通道號碼或頻率超出有效範圍時
@@ -44,18 +93,28 @@ class SG90:
         if frequency <= 0:
             logger.error(f"無效的頻率: {frequency}")
             raise ValueError("頻率必須大於 0")
+        if pca is not None and frequency != self.DEFAULT_FREQUENCY:
+            logger.warning(f"使用共用的 PCA9685 時不會重新設定頻率，忽略指定的頻率: {frequency}Hz")
 
         self._channel = channel
         self._frequency = frequency
+        self.i2c = None
+        self.pca = pca
+        self._owns_pca = pca is None
+        # 預先計算每 0.5 度的 duty cycle，索引為 (角度 - MIN_ANGLE) * STEPS_PER_DEGREE
+        self._duty_cycle_lut = array('H', (
+            self._calculate_duty_cycle(self.MIN_ANGLE + step / self.STEPS_PER_DEGREE)
+            for step in range((self.MAX_ANGLE - self.MIN_ANGLE) * self.STEPS_PER_DEGREE + 1)))
         self._initialize_hardware()
 
     def _initialize_hardware(self) -> None:
         """初始化硬體設備"""
         try:
             logger.info("開始初始化硬體設備")
-            self.i2c = busio.I2C(SCL, SDA)
-            self.pca = PCA9685(self.i2c)
-            self.pca.frequency = self._frequency
+            if self._owns_pca:
+                self.i2c = busio.I2C(SCL, SDA)
+                self.pca = PCA9685(self.i2c)
+                self.pca.frequency = self._frequency
             self.servo_channel = self.pca.channels[self._channel]
             logger.info("硬體初始化成功")
         except Exception as e:
@@ -72,10 +131,27 @@ class SG90:
         Returns:
             int: 計算出的 duty cycle 值
         """
-        # 計算脈衝寬度（微秒）
-        pulse_width = self.MIN_PULSE_WIDTH + (angle / self.MAX_ANGLE) * (self.MAX_PULSE_WIDTH - self.MIN_PULSE_WIDTH)
-        # 轉換為 duty cycle
-        return int((pulse_width / self.PULSE_PERIOD) * self.MAX_DUTY_CYCLE)
+        # 角度轉為定點數後只需一次整數乘法、加法與右移
+        angle_fixed = int(angle * (1 << self._ANGLE_FRACTION_BITS))
+        return (self._DUTY_OFFSET + angle_fixed * self._DUTY_SLOPE) >> self._DUTY_FRACTION_BITS
+
+    def _angle_to_duty_cycle(self, angle: float) -> int:
+        """
+        取得指定角度對應的 duty cycle 值
+
+        0.5 度倍數的角度直接查表，其他角度才需要計算。
+
+        Args:
+            angle (float): 目標角度 (0~90)
+
+        Returns:
+            int: duty cycle 值
+        """
+        steps = (angle - self.MIN_ANGLE) * self.STEPS_PER_DEGREE
+        index = int(steps)
+        if index == steps:
+            return self._duty_cycle_lut[index]
+        return self._calculate_duty_cycle(angle)
 
     def set_angle(self, angle: float) -> int:
         """
@@ -90,20 +166,150 @@ class SG90:
         Raises:
             ValueError: 當角度超出有效範圍時
         """
-        logger.info(f"嘗試設定角度: {angle}度")
+        logger.debug("嘗試設定角度: %s度", angle)
         if not self.MIN_ANGLE <= angle <= self.MAX_ANGLE:
             logger.error(f"角度超出範圍: {angle}度")
             raise ValueError(f"角度必須在 {self.MIN_ANGLE} 到 {self.MAX_ANGLE} 度之間")
 
-        duty_cycle = self._calculate_duty_cycle(angle)
+        duty_cycle = self._angle_to_duty_cycle(angle)
         self.servo_channel.duty_cycle = duty_cycle
         
-        # 計算實際脈衝寬度（用於除錯）
-        pulse_width = (duty_cycle / self.MAX_DUTY_CYCLE) * self.PULSE_PERIOD
-        logger.info(f"設定角度: {angle}度, 脈衝寬度: {pulse_width:.1f}us, duty_cycle: {duty_cycle}")
+        # 計算實際脈衝寬度（用於除錯），日誌等級未啟用時略過計算與格式化
+        if logger.isEnabledFor(logging.INFO):
+            pulse_width = (duty_cycle / self.MAX_DUTY_CYCLE) * self.PULSE_PERIOD
+            logger.info("設定角度: %s度, 脈衝寬度: %.1fus, duty_cycle: %d", angle, pulse_width, duty_cycle)
         
         return duty_cycle
 
+    def set_angles_bulk(self, angles: Dict[int, float]) -> Dict[int, int]:
+        """
+        以批次 I2C 寫入同時設定多個通道的角度
+
+        PCA9685 開啟自動遞增後，相鄰通道的暫存器位址是連續的，
+        因此連續的通道只需一次 I2C 傳輸即可寫入所有 LED_ON/LED_OFF 暫存器，
+        不必為每個通道各進行一次傳輸。不相鄰的通道會分段傳輸。
+
+        此方法作用於整個 PCA9685 晶片：寫入的是 angles 指定的通道，
+        與此實例建立時的 channel 無關，也不會更新其他 SG90 實例的狀態。
+        多個伺服馬達共用同一個 PCA9685 時，可透過其中任一個實例呼叫。
+
+        Args:
+            angles (Dict[int, float]): 通道號碼 (0-15) 對應目標角度 (0~90)
+
+        Returns:
+            Dict[int, int]: 通道號碼對應實際設定的 duty cycle 值
+
+        Raises:
+            ValueError: 當通道號碼或角度超出有效範圍時
+        """
+        duty_cycles = {}
+        for channel, angle in angles.items():
+            if not 0 <= channel <= 15:
+                logger.error(f"無效的通道號碼: {channel}")
+                raise ValueError("通道號碼必須在 0 到 15 之間")
+            if not self.MIN_ANGLE <= angle <= self.MAX_ANGLE:
+                logger.error(f"角度超出範圍: {angle}度")
+                raise ValueError(f"角度必須在 {self.MIN_ANGLE} 到 {self.MAX_ANGLE} 度之間")
+            duty_cycles[channel] = self._angle_to_duty_cycle(angle)
+
+        # 將通道分成連續的區段，每個區段一次傳輸
+        channels = sorted(duty_cycles)
+        start = 0
+        for end in range(1, len(channels) + 1):
+            if end < len(channels) and channels[end] == channels[end - 1] + 1:
+                continue
+            segment = channels[start:end]
+            buffer = bytearray(1 + self.CHANNEL_REGISTER_SIZE * len(segment))
+            buffer[0] = self.LED0_ON_L + self.CHANNEL_REGISTER_SIZE * segment[0]
+            for i, channel in enumerate(segment):
+                # LED_ON = 0，LED_OFF 為 12 位元的 duty cycle（與 adafruit_pca9685 相同的換算）
+                struct.pack_into('<HH', buffer, 1 + self.CHANNEL_REGISTER_SIZE * i,
+                                 0, duty_cycles[channel] >> 4)
+            with self.pca.i2c_device as i2c:
+                i2c.write(buffer)
+            start = end
+
+        logger.info("批次設定角度: %s", angles)
+        return duty_cycles
+
+    async def set_angle_async(self, angle: float) -> int:
+        """
+        非同步設定伺服馬達角度
+
+        在執行緒池中執行 set_angle()，讓 I2C 寫入可以與其他感測器的讀取重疊。
+
+        Args:
+            angle (float): 目標角度 (0~90)
+
+        Returns:
+            int: 實際設定的 duty cycle 值
+
+        Raises:
+            ValueError: 當角度超出有效範圍時
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.set_angle, angle)
+
+    @classmethod
+    def encode_trajectory(cls, angles: Iterable[float]) -> bytes:
+        """
+        將角度序列量化為 0.5 度解析度的軌跡
+
+        每個角度以一個位元組 (0~180) 表示，比浮點數串列節省記憶體，
+        播放時可直接作為查表索引。角度四捨五入到最接近的 0.5 度，
+        剛好落在中間時一律進位（例如 0.25 度與 0.75 度分別量化為 0.5 度與 1 度）。
+
+        Args:
+            angles (Iterable[float]): 角度序列 (0~90)
+
+        Returns:
+            bytes: 量化後的軌跡
+
+        Raises:
+            ValueError: 當角度超出有效範圍時
+        """
+        trajectory = bytearray()
+        for angle in angles:
+            if not cls.MIN_ANGLE <= angle <= cls.MAX_ANGLE:
+                logger.error("角度超出範圍: %s度", angle)
+                raise ValueError(f"角度必須在 {cls.MIN_ANGLE} 到 {cls.MAX_ANGLE} 度之間")
+            # 角度不小於 MIN_ANGLE，加 0.5 後截斷即為四捨五入（round() 會將 .5 捨入至偶數）
+            trajectory.append(int((angle - cls.MIN_ANGLE) * cls.STEPS_PER_DEGREE + 0.5))
+        return bytes(trajectory)
+
+    def play_trajectory(self, trajectory: bytes, interval: float) -> None:
+        """
+        依固定間隔播放 encode_trajectory 產生的軌跡
+
+        每一步只需查表取得 duty cycle 並寫入通道，不需要任何角度換算。
+
+        Args:
+            trajectory (bytes): encode_trajectory 產生的軌跡
+            interval (float): 每一步之間的間隔（秒）
+
+        Raises:
+            ValueError: 當軌跡包含超出範圍的值時（包含非 bytes 序列中的負數，
+                以免從查表的尾端取值）
+        """
+        if trajectory:
+            lowest, highest = min(trajectory), max(trajectory)
+            if lowest < 0 or highest >= len(self._duty_cycle_lut):
+                logger.error("軌跡包含超出範圍的值: %d", lowest if lowest < 0 else highest)
+                raise ValueError(f"軌跡的值必須在 0 到 {len(self._duty_cycle_lut) - 1} 之間")
+
+        logger.info("開始播放軌跡 - 共 %d 步, 間隔: %ss", len(trajectory), interval)
+        lut = self._duty_cycle_lut
+        servo_channel = self.servo_channel
+        next_step = time.monotonic()
+        for index in trajectory:
+            servo_channel.duty_cycle = lut[index]
+            # 以固定時間點排程，寫入所花的時間不會累積成誤差
+            next_step += interval
+            delay = next_step - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        logger.info("軌跡播放完成")
+
     def get_current_angle(self) -> Optional[float]:
         """
         根據當前 duty cycle 計算馬達角度
@@ -117,7 +323,7 @@ class SG90:
             angle = ((pulse_width - self.MIN_PULSE_WIDTH) / 
                     (self.MAX_PULSE_WIDTH - self.MIN_PULSE_WIDTH)) * self.MAX_ANGLE
             current_angle = max(self.MIN_ANGLE, min(self.MAX_ANGLE, angle))
-            logger.debug(f"當前角度: {current_angle}度")
+            logger.debug("當前角度: %s度", current_angle)
             return current_angle
         except Exception as e:
             logger.error(f"獲取當前角度時發生錯誤: {str(e)}")
@@ -126,7 +332,11 @@ class SG90:
     def cleanup(self) -> None:
         """
         清理資源，釋放 I2C 與 PCA9685
+
+        共用的 PCA9685 由建立它的呼叫端負責釋放，此處不會釋放。
         """
+        if not self._owns_pca:
+            return
         logger.info("開始清理資源")
         try:
             self.pca.deinit()
@@ -136,6 +346,7 @@ class SG90:
             logger.error(f"清理資源時發生錯誤: {str(e)}")
 
 if __name__ == "__main__":
+    configure_logging()
     # 測試程式碼
     logger.info("開始執行測試程式")
     servo = SG90(channel=1)
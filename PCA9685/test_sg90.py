@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 在導入 SG90 之前先模擬 board、busio 與 adafruit_pca9685
+mock_modules = {
+    'board': MagicMock(),
+    'busio': MagicMock(),
+    'adafruit_pca9685': MagicMock(),
+}
+with patch.dict(sys.modules, mock_modules):
+    from SG90 import SG90
+
+class RecordingChannel:
+    """記錄每次寫入 duty_cycle 的模擬通道"""
+
+    def __init__(self):
+        self.duty_cycles = []
+
+    @property
+    def duty_cycle(self):
+        return self.duty_cycles[-1]
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        self.duty_cycles.append(value)
+
+class TestSG90(unittest.TestCase):
+    """SG90 伺服馬達測試類別"""
+
+    def setUp(self):
+        """設置測試環境"""
+        self.mock_pca = MagicMock()
+        self.servo = SG90(channel=0, pca=self.mock_pca)
+        self.mock_i2c = self.mock_pca.i2c_device.__enter__.return_value
+
+    def written_buffers(self):
+        """回傳每次 I2C 傳輸寫入的位元組"""
+        return [bytes(call.args[0]) for call in self.mock_i2c.write.call_args_list]
+
+    @staticmethod
+    def float_duty_cycle(angle):
+        """以浮點數公式計算 duty cycle，作為定點數運算的對照"""
+        pulse_width = SG90.MIN_PULSE_WIDTH + angle / 90 * (SG90.MAX_PULSE_WIDTH - SG90.MIN_PULSE_WIDTH)
+        return int(pulse_width / 20000 * 65535)
+
+    def test_duty_cycle_matches_float_formula(self):
+        """測試定點數運算在 0.001 度間隔的所有角度都與浮點數公式一致"""
+        mismatches = [step / 1000 for step in range(90_001)
+                      if self.servo._calculate_duty_cycle(step / 1000) != self.float_duty_cycle(step / 1000)]
+        self.assertEqual(mismatches, [])
+
+    def test_duty_cycle_table_matches_float_formula(self):
+        """測試每 0.5 度的查表值與浮點數公式一致"""
+        self.assertEqual(len(self.servo._duty_cycle_lut), 181)
+        for index, duty_cycle in enumerate(self.servo._duty_cycle_lut):
+            self.assertEqual(duty_cycle, self.float_duty_cycle(index / 2), index / 2)
+
+    def test_set_angles_bulk_contiguous_channels(self):
+        """測試相鄰通道合併為一次 I2C 傳輸"""
+        duty_cycles = self.servo.set_angles_bulk({1: 90, 0: 0})
+
+        self.assertEqual(duty_cycles, {0: 3276, 1: 6553})
+        # 起始暫存器 LED0_ON_L，接著依序為各通道的 LED_ON_L/H 與 LED_OFF_L/H
+        # LED_OFF 為 duty cycle 右移 4 位元：3276 >> 4 = 0x00cc，6553 >> 4 = 0x0199
+        self.assertEqual(self.written_buffers(), [
+            bytes([0x06, 0x00, 0x00, 0xcc, 0x00, 0x00, 0x00, 0x99, 0x01]),
+        ])
+
+    def test_set_angles_bulk_split_channels(self):
+        """測試不相鄰的通道分段傳輸"""
+        duty_cycles = self.servo.set_angles_bulk({15: 90, 3: 45})
+
+        self.assertEqual(duty_cycles, {3: 4915, 15: 6553})
+        # 通道 3 的起始暫存器為 0x06 + 4 * 3，通道 15 為 0x06 + 4 * 15
+        self.assertEqual(self.written_buffers(), [
+            bytes([0x12, 0x00, 0x00, 0x33, 0x01]),
+            bytes([0x42, 0x00, 0x00, 0x99, 0x01]),
+        ])
+
+    def test_set_angles_bulk_invalid_input(self):
+        """測試無效的通道或角度不會寫入任何暫存器"""
+        with self.assertRaises(ValueError):
+            self.servo.set_angles_bulk({16: 45})
+        with self.assertRaises(ValueError):
+            self.servo.set_angles_bulk({0: 45, 1: 91})
+        self.mock_i2c.write.assert_not_called()
+
+    def test_encode_trajectory(self):
+        """測試角度量化為 0.5 度解析度，剛好落在中間時一律進位"""
+        trajectory = SG90.encode_trajectory([0, 0.25, 0.75, 45.26, 90])
+
+        self.assertIsInstance(trajectory, bytes)
+        self.assertEqual(list(trajectory), [0, 1, 2, 91, 180])
+
+    def test_encode_trajectory_out_of_range(self):
+        """測試超出範圍的角度"""
+        with self.assertRaises(ValueError):
+            SG90.encode_trajectory([45, 91])
+        with self.assertRaises(ValueError):
+            SG90.encode_trajectory([-0.5])
+
+    @patch('time.sleep')
+    def test_play_trajectory(self, mock_sleep):
+        """測試播放軌跡時依序寫入查表的 duty cycle"""
+        channel = RecordingChannel()
+        self.servo.servo_channel = channel
+
+        self.servo.play_trajectory(SG90.encode_trajectory([0, 45, 90]), 0.02)
+
+        self.assertEqual(channel.duty_cycles, [3276, 4915, 6553])
+
+    def test_play_trajectory_out_of_range(self):
+        """測試軌跡包含超出查表範圍的值（包含負數）時不寫入任何值"""
+        channel = RecordingChannel()
+        self.servo.servo_channel = channel
+
+        with self.assertRaises(ValueError):
+            self.servo.play_trajectory(bytes([0, 181]), 0)
+        with self.assertRaises(ValueError):
+            self.servo.play_trajectory([0, -1], 0)
+        self.assertEqual(channel.duty_cycles, [])
+
+if __name__ == '__main__':
+    unittest.main()